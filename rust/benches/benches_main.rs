@@ -18,7 +18,7 @@ fn shannon_entropy(c: &mut Criterion) {
             BenchmarkId::from_parameter(sample_size),
             &sample_size,
             |b, &size| {
-                b.iter(|| unblob::shannon_entropy(&sample[0..size]));
+                b.iter(|| unblob::math::shannon_entropy(&sample[0..size]));
             },
         );
     }
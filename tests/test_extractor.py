@@ -1,8 +1,12 @@
+import errno
+import os
 from pathlib import Path, PosixPath
 
 import pytest
 
+from unblob import extractor
 from unblob.extractor import (
+    carve_chunk_to_file,
     carve_unknown_chunk,
     fix_extracted_directory,
     fix_permission,
@@ -21,6 +25,56 @@ def test_carve_unknown_chunk(tmp_path: Path):
     assert written_path.read_bytes() == content[1:8]
 
 
+def _raise_oserror(*args):
+    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+
+@pytest.mark.parametrize(
+    "disabled_functions, expected_copy",
+    [
+        pytest.param([], "_copy_file_range", id="copy_file_range"),
+        pytest.param(["copy_file_range"], "_sendfile", id="sendfile"),
+        pytest.param(["copy_file_range", "sendfile"], "iterate_file", id="userspace"),
+    ],
+)
+def test_carve_chunk_to_file_from_path(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    disabled_functions,
+    expected_copy: str,
+):
+    for function in disabled_functions:
+        monkeypatch.setattr(os, function, _raise_oserror, raising=False)
+
+    # records the copy functions which completed without an error
+    completed_copies = []
+
+    def spy(name):
+        copy_function = getattr(extractor, name)
+
+        def wrapper(*args):
+            result = copy_function(*args)
+            completed_copies.append(name)
+            return result
+
+        monkeypatch.setattr(extractor, name, wrapper)
+
+    for name in ("_copy_file_range", "_sendfile", "iterate_file"):
+        spy(name)
+
+    content = bytes(range(256)) * 1024
+    src_path = tmp_path / "src"
+    src_path.write_bytes(content)
+    carve_path = tmp_path / "carved"
+    chunk = UnknownChunk(3, len(content) - 5)
+
+    with File.from_path(src_path) as test_file:
+        carve_chunk_to_file(carve_path, test_file, chunk)
+
+    assert completed_copies == [expected_copy]
+    assert carve_path.read_bytes() == content[3:-5]
+
+
 def test_fix_permission(tmpdir: Path):
     tmpdir = PosixPath(tmpdir)
     tmpfile = PosixPath(tmpdir / "file.txt")
@@ -1,23 +1,10 @@
 import pytest
 
 from unblob.file_utils import InvalidInputFormat
-from unblob.models import Chunk, UnknownChunk
+from unblob.models import Chunk, StructHandler, UnknownChunk
 
 
 class TestChunk:
-    @pytest.mark.parametrize(
-        "chunk1, chunk2, result",
-        (
-            (Chunk(0, 10), Chunk(1, 2), True),
-            (Chunk(0, 10), Chunk(11, 12), False),
-            (Chunk(0, 10), Chunk(15, 20), False),
-            (Chunk(1, 2), Chunk(3, 5), False),
-            (Chunk(0, 10), Chunk(1, 10), True),
-        ),
-    )
-    def test_contains(self, chunk1, chunk2, result):
-        assert chunk1.contains(chunk2) is result
-
     def test_range_hex(self):
         chunk = UnknownChunk(start_offset=3, end_offset=10)
         assert chunk.range_hex == "0x3-0xa"
@@ -47,3 +34,21 @@ class TestChunk:
     def test_validation(self, start_offset, end_offset):
         with pytest.raises(InvalidInputFormat):
             Chunk(start_offset, end_offset)
+
+
+class TestStructHandler:
+    class _Handler(StructHandler):
+        NAME = "test"
+        PATTERNS = []
+        EXTRACTOR = None
+        C_DEFINITIONS = "struct header { uint32 magic; };"
+        HEADER_STRUCT = "header"
+
+        def calculate_chunk(self, file, start_offset):
+            return None
+
+    def test_parser_is_shared_between_instances(self):
+        handler1 = self._Handler()
+        handler2 = self._Handler()
+        assert handler1.cparser_le is handler2.cparser_le
+        assert handler1.cparser_be is handler2.cparser_be
@@ -59,6 +59,43 @@ def test_multipool(process_num: int):
     assert list(results) == [5, 4, 3, 2, 1, 0]
 
 
+@pytest.mark.parametrize("process_num", range(1, 5))
+def test_multipool_submit_many(process_num: int):
+    results = []
+
+    def _handler(i):
+        return i
+
+    def _callback(pool, result):
+        results.append(result)
+        if result == 0:
+            pool.submit_many(range(1, 100))
+
+    with MultiPool(
+        process_num=process_num, handler=_handler, result_callback=_callback
+    ) as pool:
+        pool.submit_many([0])
+        pool.process_until_done()
+
+    assert sorted(results) == list(range(100))
+
+
+def test_singlepool_submit_many():
+    results = []
+
+    def _handler(i):
+        return i
+
+    def _callback(_pool, result):
+        results.append(result)
+
+    with SinglePool(handler=_handler, result_callback=_callback) as pool:
+        pool.submit_many([1, 2, 3])
+        pool.process_until_done()
+
+    assert results == [1, 2, 3]
+
+
 def test_input_cannot_be_submitted_from_worker():
     pool: MultiPool
 
@@ -1,17 +1,38 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List
 
 import attr
 import pytest
 
-from unblob.models import UnknownChunk, ValidChunk
+from unblob import processing
+from unblob.models import (
+    Extractor,
+    File,
+    Handler,
+    Regex,
+    Task,
+    TaskResult,
+    UnknownChunk,
+    ValidChunk,
+)
 from unblob.processing import (
     ExtractionConfig,
+    Processor,
     calculate_buffer_size,
     calculate_entropy,
-    calculate_unknown_chunks,
     draw_entropy_plot,
-    remove_inner_chunks,
+    partition_chunks,
+)
+from unblob.report import (
+    ChunkReport,
+    FileMagicReport,
+    HashReport,
+    StatReport,
+    UnknownError,
 )
 
 
@@ -42,6 +63,14 @@ def assert_same_chunks(expected, actual, explanation=None):
             [ValidChunk(0, 5)],
             "One chunk within another",
         ),
+        (
+            [
+                ValidChunk(1, 10),
+                ValidChunk(2, 10),
+            ],
+            [ValidChunk(1, 10)],
+            "Chunk within another, ending at the same offset",
+        ),
         (
             [
                 ValidChunk(10, 20),
@@ -78,12 +107,50 @@ def assert_same_chunks(expected, actual, explanation=None):
             [ValidChunk(1, 5), ValidChunk(6, 10)],
             "Multiple outer chunks, with chunks inside",
         ),
+        (
+            [
+                ValidChunk(3, 7),
+                ValidChunk(0, 10),
+                ValidChunk(4, 6),
+            ],
+            [ValidChunk(0, 10)],
+            "Nested chunks within each other",
+        ),
+        (
+            [
+                ValidChunk(1, 5),
+                ValidChunk(1, 3),
+                ValidChunk(2, 5),
+            ],
+            [ValidChunk(1, 5), ValidChunk(1, 3)],
+            "Chunks starting at the same offset are not within each other",
+        ),
+        (
+            [
+                ValidChunk(6, 10),
+                ValidChunk(0, 5),
+                ValidChunk(3, 8),
+            ],
+            [ValidChunk(0, 5), ValidChunk(3, 8), ValidChunk(6, 10)],
+            "Overlapping chunks, ordered by offset",
+        ),
+        (
+            [
+                ValidChunk(0, 4),
+                ValidChunk(2, 6),
+                ValidChunk(0, 10),
+            ],
+            [ValidChunk(0, 10)],
+            "Chunk covering the whole file",
+        ),
     ],
 )
-def test_remove_inner_chunks(
+def test_partition_chunks_outer_chunks(
     chunks: List[ValidChunk], expected: List[ValidChunk], explanation: str
 ):
-    assert_same_chunks(expected, remove_inner_chunks(chunks), explanation)
+    file_size = max((chunk.end_offset for chunk in chunks), default=0)
+    outer_chunks, _ = partition_chunks(chunks, file_size)
+    assert_same_chunks(expected, outer_chunks, explanation)
 
 
 @pytest.mark.parametrize(
@@ -101,12 +168,18 @@ def test_remove_inner_chunks(
             20,
             [UnknownChunk(0x5, 0x8), UnknownChunk(0xA, 0xF)],
         ),
+        (
+            [ValidChunk(0x2, 0x6), ValidChunk(0x4, 0x8), ValidChunk(0x3, 0x5)],
+            10,
+            [UnknownChunk(0x0, 0x2), UnknownChunk(0x8, 0xA)],
+        ),
     ],
 )
-def test_calculate_unknown_chunks(
+def test_partition_chunks_unknown_chunks(
     chunks: List[ValidChunk], file_size: int, expected: List[UnknownChunk]
 ):
-    assert_same_chunks(expected, calculate_unknown_chunks(chunks, file_size))
+    _, unknown_chunks = partition_chunks(chunks, file_size)
+    assert_same_chunks(expected, unknown_chunks)
 
 
 @pytest.mark.parametrize(
@@ -136,6 +209,7 @@ def test_draw_entropy_plot_error():
         pytest.param([0.0] * 100, id="zero-array"),
         pytest.param([99.99] * 100, id="99-array"),
         pytest.param([100.0] * 100, id="100-array"),
+        pytest.param([50.0] * 4500, id="large-array"),
     ],
 )
 def test_draw_entropy_plot_no_exception(percentages: List[float]):
@@ -143,14 +217,30 @@ def test_draw_entropy_plot_no_exception(percentages: List[float]):
 
 
 @pytest.mark.parametrize(
-    "path, draw_plot",
+    "path, draw_plot, thread_num",
     [
-        pytest.param(Path("/proc/self/exe"), True, id="draw-plot"),
-        pytest.param(Path("/proc/self/exe"), False, id="no-plot"),
+        pytest.param(Path("/proc/self/exe"), True, 1, id="draw-plot"),
+        pytest.param(Path("/proc/self/exe"), False, 1, id="no-plot"),
+        pytest.param(Path("/proc/self/exe"), False, 4, id="multi-thread"),
     ],
 )
-def test_calculate_entropy_no_exception(path: Path, draw_plot: bool):
-    assert calculate_entropy(path, draw_plot=draw_plot) is None
+def test_calculate_entropy_no_exception(path: Path, draw_plot: bool, thread_num: int):
+    assert calculate_entropy(path, draw_plot=draw_plot, thread_num=thread_num) is None
+
+
+def test_calculate_entropy_multi_thread_same_percentages(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    plotted = []
+    monkeypatch.setattr("unblob.processing.draw_entropy_plot", plotted.append)
+
+    path = Path("/proc/self/exe")
+    calculate_entropy(path, draw_plot=True, thread_num=1)
+    calculate_entropy(path, draw_plot=True, thread_num=4)
+
+    single_thread_percentages, multi_thread_percentages = plotted
+    assert len(single_thread_percentages) > 1
+    assert multi_thread_percentages == single_thread_percentages
 
 
 @pytest.mark.parametrize(
@@ -177,3 +267,212 @@ def test_ExtractionConfig_get_extract_dir_for(
 ):
     cfg = ExtractionConfig(extract_root=Path(extract_root), entropy_depth=0)
     assert cfg.get_extract_dir_for(Path(path)) == Path(result)
+
+
+def test_process_directory_processes_ignored_entries_in_place(tmp_path: Path):
+    directory = tmp_path / "dir"
+    directory.mkdir()
+    (directory / "subdir").mkdir()
+    (directory / "file").write_bytes(b"content")
+    (directory / "empty").touch()
+    (directory / "link").symlink_to("file")
+    (directory / os.fsdecode(b"bad\xff")).write_bytes(b"content")
+
+    config = ExtractionConfig(extract_root=tmp_path / "extract", entropy_depth=0)
+    dir_result, *entry_results = Processor(config).process_task(
+        Task(path=directory, depth=0, chunk_id="")
+    )
+
+    assert sorted(task.path.name for task in dir_result.subtasks) == ["file", "subdir"]
+    assert [type(r) for r in dir_result.reports] == [StatReport]
+
+    # every entry processed in place has its own result, like a subtask would
+    results = {r.task.path.name: r for r in entry_results}
+    assert sorted(results) == ["bad\udcff", "empty", "link"]
+    # paths with invalid characters are not processed, but still have a result
+    assert results["bad\udcff"].reports == []
+    assert [type(r) for r in results["empty"].reports] == [
+        StatReport,
+        FileMagicReport,
+        HashReport,
+    ]
+    (link_report,) = results["link"].reports
+    assert link_report.is_link
+    assert link_report.link_target == Path("file")
+    assert all(not r.subtasks for r in entry_results)
+
+
+def test_process_directory_entry_stat_error(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    directory = tmp_path / "dir"
+    directory.mkdir()
+    (directory / "vanished").write_bytes(b"content")
+    (directory / "empty").touch()
+
+    class VanishedEntry:
+        def __init__(self, entry):
+            self._entry = entry
+            self.path = entry.path
+
+        def is_dir(self, follow_symlinks):
+            return False
+
+        def is_file(self, follow_symlinks):
+            return True
+
+        def stat(self, follow_symlinks):
+            raise FileNotFoundError(self.path)
+
+    scandir = os.scandir
+
+    @contextmanager
+    def fake_scandir(path):
+        with scandir(path) as entries:
+            yield [VanishedEntry(e) if e.name == "vanished" else e for e in entries]
+
+    monkeypatch.setattr(os, "scandir", fake_scandir)
+
+    config = ExtractionConfig(extract_root=tmp_path / "extract", entropy_depth=0)
+    dir_result, *entry_results = Processor(config).process_task(
+        Task(path=directory, depth=0, chunk_id="")
+    )
+
+    # the failing entry is left to its subtask, the other entries are processed
+    assert [task.path.name for task in dir_result.subtasks] == ["vanished"]
+    assert [r.task.path.name for r in entry_results] == ["empty"]
+
+
+class _CopyExtractor(Extractor):
+    def extract(self, inpath: Path, outdir: Path):
+        (outdir / "data").write_bytes(inpath.read_bytes())
+
+
+class _BarrierExtractor(_CopyExtractor):
+    """Only succeeds if both chunks are extracted at the same time."""
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def extract(self, inpath: Path, outdir: Path):
+        self.barrier.wait()
+        super().extract(inpath, outdir)
+
+
+class _ConcurrencyTrackingExtractor(_CopyExtractor):
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def extract(self, inpath: Path, outdir: Path):
+        cls = type(self)
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+        time.sleep(0.1)
+        with cls.lock:
+            cls.running -= 1
+        super().extract(inpath, outdir)
+
+
+class _CarvedChunksRecordingExtractor(_CopyExtractor):
+    carved_chunks = []
+
+    def extract(self, inpath: Path, outdir: Path):
+        self.carved_chunks.append(sorted(p.name for p in inpath.parent.glob("*.chunk")))
+        super().extract(inpath, outdir)
+
+
+class _ChunkHandler(Handler):
+    NAME = "chunk"
+    PATTERNS = [Regex("CHUNK")]
+    EXTRACTOR = _CopyExtractor()
+
+    def calculate_chunk(self, file: File, start_offset: int) -> ValidChunk:
+        return ValidChunk(start_offset=start_offset, end_offset=start_offset + 5)
+
+
+class _BarrierChunkHandler(_ChunkHandler):
+    EXTRACTOR = _BarrierExtractor()
+
+
+class _ConcurrencyTrackingChunkHandler(_ChunkHandler):
+    EXTRACTOR = _ConcurrencyTrackingExtractor()
+
+
+class _CarvedChunksRecordingChunkHandler(_ChunkHandler):
+    EXTRACTOR = _CarvedChunksRecordingExtractor()
+
+
+def _two_chunks_processor(tmp_path: Path, handler) -> Processor:
+    config = ExtractionConfig(
+        extract_root=tmp_path / "extract",
+        entropy_depth=0,
+        process_num=2,
+        handlers=(handler,),
+    )
+    return Processor(config)
+
+
+def _process_two_chunks(tmp_path: Path, processor: Processor) -> TaskResult:
+    input_file = tmp_path / "input"
+    input_file.write_bytes(b"CHUNK-CHUNK")
+    (result,) = processor.process_task(Task(path=input_file, depth=0, chunk_id=""))
+    return result
+
+
+def test_process_chunks_extracts_in_parallel(tmp_path: Path):
+    processor = _two_chunks_processor(tmp_path, _BarrierChunkHandler)
+    result = _process_two_chunks(tmp_path, processor)
+
+    chunk_reports = [r for r in result.reports if isinstance(r, ChunkReport)]
+    assert [(r.start_offset, r.end_offset) for r in chunk_reports] == [(0, 5), (6, 11)]
+    assert all(not r.extraction_reports for r in chunk_reports)
+    assert [task.path.name for task in result.subtasks] == [
+        "0-5.chunk_extract",
+        "6-11.chunk_extract",
+    ]
+
+
+def test_process_chunks_extractions_are_limited_across_workers(tmp_path: Path):
+    processor = _two_chunks_processor(tmp_path, _ConcurrencyTrackingChunkHandler)
+    # another worker is extracting
+    with processor._extraction_slots:
+        result = _process_two_chunks(tmp_path, processor)
+
+    assert _ConcurrencyTrackingExtractor.max_running == 1
+    assert len(result.subtasks) == 2
+
+
+def test_process_chunks_failing_chunk_keeps_other_results(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    fix_extracted_directory = processing.fix_extracted_directory
+
+    def fail_for_first_chunk(outdir: Path, task_result):
+        if outdir.name.startswith("0-5."):
+            raise PermissionError(outdir)
+        fix_extracted_directory(outdir, task_result)
+
+    monkeypatch.setattr(processing, "fix_extracted_directory", fail_for_first_chunk)
+
+    processor = _two_chunks_processor(tmp_path, _ChunkHandler)
+    result = _process_two_chunks(tmp_path, processor)
+
+    chunk_reports = [r for r in result.reports if isinstance(r, ChunkReport)]
+    assert [(r.start_offset, r.end_offset) for r in chunk_reports] == [(0, 5), (6, 11)]
+    (error,) = [r for r in result.reports if isinstance(r, UnknownError)]
+    assert "PermissionError" in error.exception
+    assert [task.path.name for task in result.subtasks] == ["6-11.chunk_extract"]
+
+
+def test_process_chunks_carves_chunks_just_before_extraction(tmp_path: Path):
+    processor = _two_chunks_processor(tmp_path, _CarvedChunksRecordingChunkHandler)
+    # another worker is extracting, so the chunks are processed one by one
+    with processor._extraction_slots:
+        _process_two_chunks(tmp_path, processor)
+
+    # the next chunk is only carved after the previous one was extracted and removed
+    assert sorted(_CarvedChunksRecordingExtractor.carved_chunks) == [
+        ["0-5.chunk"],
+        ["6-11.chunk"],
+    ]
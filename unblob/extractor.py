@@ -13,11 +13,63 @@ from .report import MaliciousSymlinkRemoved
 logger = get_logger()
 
 
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, size: int):
+    end_offset = offset + size
+    while offset < end_offset:
+        copied = os.copy_file_range(src_fd, dst_fd, end_offset - offset, offset)
+        if not copied:
+            raise EOFError(f"Source ended at offset {offset} during copy_file_range")
+        offset += copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, size: int):
+    end_offset = offset + size
+    while offset < end_offset:
+        copied = os.sendfile(dst_fd, src_fd, offset, end_offset - offset)
+        if not copied:
+            raise EOFError(f"Source ended at offset {offset} during sendfile")
+        offset += copied
+
+
+def _carve_in_kernel(carve_path: Path, src_path: Path, chunk: Chunk) -> bool:
+    """Copy the chunk without moving the data through userspace.
+
+    copy_file_range can share the blocks on reflink capable file systems (btrfs, xfs),
+    sendfile works with more file system combinations. Returns False if none of them
+    are usable, in which case the caller should copy the data itself.
+    """
+    copy_functions = []
+    if hasattr(os, "copy_file_range"):
+        copy_functions.append(_copy_file_range)
+    if hasattr(os, "sendfile"):
+        copy_functions.append(_sendfile)
+
+    with src_path.open("rb") as src:
+        for copy_function in copy_functions:
+            try:
+                with carve_path.open("wb") as dst:
+                    copy_function(
+                        src.fileno(), dst.fileno(), chunk.start_offset, chunk.size
+                    )
+                return True
+            except (OSError, EOFError) as e:
+                logger.debug(
+                    "In-kernel copy failed",
+                    method=copy_function.__name__,
+                    error=e,
+                    _verbosity=2,
+                )
+    return False
+
+
 def carve_chunk_to_file(carve_path: Path, file: File, chunk: Chunk):
     """Extract valid chunk to a file, which we then pass to another tool to extract it."""
     carve_path.parent.mkdir(parents=True, exist_ok=True)
     logger.debug("Carving chunk", path=carve_path)
 
+    if file.path is not None and _carve_in_kernel(carve_path, file.path, chunk):
+        return
+
     with carve_path.open("wb") as f:
         for data in iterate_file(file, chunk.start_offset, chunk.size):
             f.write(data)
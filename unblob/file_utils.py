@@ -6,7 +6,7 @@ import os
 import shutil
 import struct
 from pathlib import Path
-from typing import Iterator, Tuple
+from typing import Iterator, Optional, Tuple
 
 from dissect.cstruct import cstruct
 from pyperscan import Scan
@@ -21,6 +21,9 @@ class SeekError(ValueError):
 
 
 class File(mmap.mmap):
+    # The file the mapping was created from, None for anonymous mappings
+    path: Optional[Path] = None
+
     @classmethod
     def from_bytes(cls, content: bytes):
         m = cls(-1, len(content))
@@ -31,7 +34,9 @@ class File(mmap.mmap):
     @classmethod
     def from_path(cls, path: Path):
         with path.open("rb") as base_file:
-            return cls(base_file.fileno(), 0, access=mmap.ACCESS_READ)
+            m = cls(base_file.fileno(), 0, access=mmap.ACCESS_READ)
+        m.path = path
+        return m
 
     def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
         try:
@@ -54,6 +59,13 @@ class File(mmap.mmap):
         finally:
             return size
 
+    def advise_sequential(self):
+        """Hint the kernel that the mapping is going to be read from start to end,
+        so it can read ahead aggressively and drop pages behind us."""
+        # madvise and its flags are not available on every platform
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.madvise(mmap.MADV_SEQUENTIAL)
+
     def __enter__(self):
         return self
 
@@ -236,27 +248,17 @@ def iterate_file(
             "The file needs to be read until a specific size, so buffer_size must be greater than 0"
         )
 
-    read_bytes = 0
-    file.seek(start_offset)
-    file_read = file.read
-    while read_bytes < size:
-        remaining = size - read_bytes
-        if remaining < buffer_size:
-            buffer_size = remaining
-        read_bytes += buffer_size
-        data = file_read(buffer_size)
-
-        if data == b"":
-            # We've reached the end of the stream.
-            break
-
-        yield data
+    # Slicing doesn't move the file position, so the same file can be iterated
+    # from multiple threads at once
+    end_offset = min(start_offset + size, len(file))
+    for offset in range(start_offset, end_offset, buffer_size):
+        yield file[offset : min(offset + buffer_size, end_offset)]  # noqa: E203
 
 
-def stream_scan(scanner, file: File):
-    """Scan the whole file by increment of DEFAULT_BUFSIZE using Hyperscan's streaming mode."""
-    for i in range(0, file.size(), DEFAULT_BUFSIZE):
-        if scanner.scan(file[i : i + DEFAULT_BUFSIZE]) == Scan.Terminate:  # noqa: E203
+def stream_scan(scanner, file: File, buffer_size: int = DEFAULT_BUFSIZE):
+    """Scan the whole file by increment of buffer_size using Hyperscan's streaming mode."""
+    for i in range(0, file.size(), buffer_size):
+        if scanner.scan(file[i : i + buffer_size]) == Scan.Terminate:  # noqa: E203
             break
 
 
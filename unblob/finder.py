@@ -17,6 +17,11 @@ from .report import CalculateChunkExceptionReport
 
 logger = get_logger()
 
+# Hyperscan's streaming mode finds matches across block boundaries, so the block
+# size only trades memory for per-call overhead: every call copies a block out of
+# the file and enters the scanner from Python.
+SEARCH_BUFSIZE = 1024 * 1024
+
 
 @attr.define
 class HyperscanMatchContext:
@@ -75,7 +80,7 @@ def _hyperscan_match(
         return Scan.Continue
 
     # Skip chunk calculation if this would start inside another one,
-    # similar to remove_inner_chunks, but before we even begin calculating.
+    # similar to partition_chunks, but before we even begin calculating.
     if any(chunk.contains_offset(real_offset) for chunk in context.all_chunks):
         logger.debug(
             "Skip chunk calculation as pattern is inside an other chunk",
@@ -138,8 +143,9 @@ def search_chunks(  # noqa: C901
 
     scanner = hyperscan_db.build(hyperscan_context, _hyperscan_match)
 
+    file.advise_sequential()
     try:
-        stream_scan(scanner, file)
+        stream_scan(scanner, file, buffer_size=SEARCH_BUFSIZE)
     except Exception as e:
         logger.error(
             "Error scanning for patterns",
@@ -1,4 +1,9 @@
 try:
     from ._rust import shannon_entropy
+
+    # The Rust implementation releases the GIL, so it can run on multiple threads
+    RUST_EXTENSION_LOADED = True
 except ImportError:
     from ._py.math import shannon_entropy  # noqa: F401
+
+    RUST_EXTENSION_LOADED = False
@@ -2,6 +2,7 @@ import abc
 import itertools
 import json
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Tuple, Type
 
@@ -63,12 +64,6 @@ class Chunk:
     def range_hex(self) -> str:
         return f"0x{self.start_offset:x}-0x{self.end_offset:x}"
 
-    def contains(self, other: "Chunk") -> bool:
-        return (
-            self.start_offset < other.start_offset
-            and self.end_offset >= other.end_offset
-        )
-
     def contains_offset(self, offset: int) -> bool:
         return self.start_offset <= offset < self.end_offset
 
@@ -293,13 +288,19 @@ class Handler(abc.ABC):
         self.EXTRACTOR.extract(inpath, outdir)
 
 
+@lru_cache
+def _get_struct_parser(definitions: str) -> StructParser:
+    """Share the parser between handler instances, so definitions are compiled only once."""
+    return StructParser(definitions)
+
+
 class StructHandler(Handler):
     C_DEFINITIONS: str
     # A struct from the C_DEFINITIONS used to parse the file's header
     HEADER_STRUCT: str
 
     def __init__(self):
-        self._struct_parser = StructParser(self.C_DEFINITIONS)
+        self._struct_parser = _get_struct_parser(self.C_DEFINITIONS)
 
     @property
     def cparser_le(self):
@@ -5,7 +5,7 @@ import queue
 import sys
 import threading
 from multiprocessing.queues import JoinableQueue
-from typing import Any, Callable, Union
+from typing import Any, Callable, Iterable, Union
 
 from .logging import multiprocessing_breakpoint
 
@@ -15,6 +15,10 @@ class PoolBase(abc.ABC):
     def submit(self, args):
         pass
 
+    def submit_many(self, args_list: Iterable):
+        for args in args_list:
+            self.submit(args)
+
     @abc.abstractmethod
     def process_until_done(self):
         pass
@@ -40,6 +44,25 @@ class Queue(JoinableQueue):
         with self._cond:  # type: ignore
             return self._unfinished_tasks._semlock._is_zero()  # type: ignore
 
+    def put_many(self, objs: Iterable):
+        """Puts all items, taking the locks and waking up the feeder thread only once.
+        Based on ``multiprocessing.JoinableQueue.put``."""
+        objs = list(objs)
+        if self._closed:  # type: ignore
+            raise ValueError(f"Queue {self!r} is closed")
+        if not objs:
+            return
+        for _ in objs:
+            self._sem.acquire()  # type: ignore
+
+        with self._notempty, self._cond:  # type: ignore
+            if self._thread is None:  # type: ignore
+                self._start_thread()  # type: ignore
+            self._buffer.extend(objs)  # type: ignore
+            for _ in objs:
+                self._unfinished_tasks.release()  # type: ignore
+            self._notempty.notify()  # type: ignore
+
 
 class _Sentinel:
     pass
@@ -116,14 +139,21 @@ class MultiPool(PoolBase):
         for p in self._procs:
             p.join()
 
-    def submit(self, args):
+    def _check_submitting_thread(self):
         if threading.get_native_id() != self._tid:
             raise RuntimeError(
                 "Submit can only be called from the same "
                 "thread/process where the pool is created"
             )
+
+    def submit(self, args):
+        self._check_submitting_thread()
         self._input.put(args)
 
+    def submit_many(self, args_list: Iterable):
+        self._check_submitting_thread()
+        self._input.put_many(args_list)
+
     def process_until_done(self):
         while not self._input.is_empty():
             result = self._output.get()
@@ -1,9 +1,12 @@
 import multiprocessing
+import os
 import shutil
 import statistics
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.synchronize import BoundedSemaphore
 from operator import attrgetter
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Iterable, List, Optional, Tuple
 
 import attr
 import magic
@@ -13,11 +16,10 @@ from structlog import get_logger
 from unblob.handlers import BUILTIN_HANDLERS, Handlers
 
 from .extractor import carve_unknown_chunk, carve_valid_chunk, fix_extracted_directory
-from .file_utils import iterate_file, valid_path
-from .finder import search_chunks
-from .iter_utils import pairwise
+from .file_utils import valid_path
+from .finder import build_hyperscan_database, search_chunks
 from .logging import noformat
-from .math import shannon_entropy
+from .math import RUST_EXTENSION_LOADED, shannon_entropy
 from .models import (
     ExtractError,
     File,
@@ -133,10 +135,14 @@ def _process_task(config: ExtractionConfig, task: Task) -> ProcessResult:
     processor = Processor(config)
     aggregated_result = ProcessResult()
 
-    def process_result(pool, result):
-        for new_task in result.subtasks:
-            pool.submit(new_task)
-        aggregated_result.register(result)
+    # Compile the pattern database before the workers are forked, so they inherit
+    # it instead of each of them compiling the same database on its first file.
+    build_hyperscan_database(config.handlers)
+
+    def process_result(pool, results):
+        for result in results:
+            pool.submit_many(result.subtasks)
+            aggregated_result.register(result)
 
     pool = make_pool(
         process_num=config.process_num,
@@ -230,11 +236,25 @@ class Processor:
         # accuracy by no shadowing rules.
         self._get_magic = magic.Magic(keep_going=True).from_file
         self._get_mime_type = magic.Magic(mime=True).from_file
-
-    def process_task(self, task: Task) -> TaskResult:
+        # The processor is created before the workers are forked, so this limits the
+        # concurrent chunk extractions across all of them, not only within a file.
+        self._extraction_slots = multiprocessing.BoundedSemaphore(config.process_num)
+
+    def process_task(self, task: Task) -> List[TaskResult]:
+        """Process the task, its result is the first one in the returned list.
+
+        The results of directory entries processed in place follow it.
+        """
+        entry_results = []
+        result = self._process_task_result(task, entry_results)
+        return [result, *entry_results]
+
+    def _process_task_result(
+        self, task: Task, entry_results: List[TaskResult]
+    ) -> TaskResult:
         result = TaskResult(task)
         try:
-            self._process_task(result, task)
+            self._process_task(result, task, entry_results)
         except Exception as exc:
             self._process_error(result, exc)
         return result
@@ -244,7 +264,9 @@ class Processor:
         result.add_report(error_report)
         logger.exception("Unknown error happened", exc_info=exc)
 
-    def _process_task(self, result: TaskResult, task: Task):
+    def _process_task(
+        self, result: TaskResult, task: Task, entry_results: List[TaskResult]
+    ):
         log = logger.bind(path=task.path)
 
         if task.depth >= self._config.max_depth:
@@ -261,14 +283,7 @@ class Processor:
 
         if stat_report.is_dir:
             log.debug("Found directory")
-            for path in task.path.iterdir():
-                result.add_subtask(
-                    Task(
-                        chunk_id=task.chunk_id,
-                        path=path,
-                        depth=task.depth,
-                    )
-                )
+            self._process_directory(result, task, entry_results)
             return
 
         if not stat_report.is_file:
@@ -299,7 +314,54 @@ class Processor:
             log.debug("Ignoring file based on magic", magic=magic)
             return
 
-        _FileTask(self._config, task, stat_report.size, result).process()
+        _FileTask(
+            self._config, task, stat_report.size, result, self._extraction_slots
+        ).process()
+
+    def _process_directory(
+        self, result: TaskResult, task: Task, entry_results: List[TaskResult]
+    ):
+        """Create subtasks for the directory entries which need further processing.
+
+        Entries which would be ignored anyway (links, special and empty files, and
+        paths with invalid characters) are processed in place, sparing a round-trip
+        through the pool for each of them. Their results are added to entry_results.
+        """
+        in_place_count = 0
+        with os.scandir(task.path) as entries:
+            for entry in entries:
+                entry_task = Task(
+                    chunk_id=task.chunk_id,
+                    path=Path(entry.path),
+                    depth=task.depth,
+                )
+                if valid_path(entry_task.path) and _needs_subtask(entry):
+                    result.add_subtask(entry_task)
+                else:
+                    entry_results.append(
+                        self._process_task_result(entry_task, entry_results)
+                    )
+                    in_place_count += 1
+
+        logger.debug(
+            "Processed ignored directory entries in place",
+            path=task.path,
+            count=noformat(in_place_count),
+            _verbosity=2,
+        )
+
+
+def _needs_subtask(entry: os.DirEntry) -> bool:
+    # The entry type comes from the directory listing, only regular
+    # files need a stat() call for their size.
+    try:
+        return entry.is_dir(follow_symlinks=False) or (
+            entry.is_file(follow_symlinks=False)
+            and entry.stat(follow_symlinks=False).st_size > 0
+        )
+    except OSError:
+        # e.g. the entry was deleted since listing, the subtask reports the error
+        return True
 
 
 class _FileTask:
@@ -309,11 +371,13 @@ class _FileTask:
         task: Task,
         size: int,
         result: TaskResult,
+        extraction_slots: BoundedSemaphore,
     ):
         self.config = config
         self.task = task
         self.size = size
         self.result = result
+        self.extraction_slots = extraction_slots
 
         self.carve_dir = config.get_extract_dir_for(self.task.path)
 
@@ -324,8 +388,7 @@ class _FileTask:
             all_chunks = search_chunks(
                 file, self.size, self.config.handlers, self.result
             )
-            outer_chunks = remove_inner_chunks(all_chunks)
-            unknown_chunks = calculate_unknown_chunks(outer_chunks, self.size)
+            outer_chunks, unknown_chunks = partition_chunks(all_chunks, self.size)
 
             if outer_chunks or unknown_chunks:
                 self._process_chunks(file, outer_chunks, unknown_chunks)
@@ -350,8 +413,34 @@ class _FileTask:
             self._calculate_entropy(carved_unknown_path)
             self.result.add_report(chunk.as_report())
 
-        for chunk in outer_chunks:
-            self._extract_chunk(file, chunk)
+        if not outer_chunks:
+            return
+
+        # The extractions are independent of each other and mostly wait for
+        # external commands, so they can run in parallel. How many of them run at
+        # once across all workers is limited by extraction_slots.
+        chunk_results = [TaskResult(self.task) for _ in outer_chunks]
+        thread_num = min(len(outer_chunks), self.config.process_num)
+        with ThreadPoolExecutor(max_workers=thread_num) as executor:
+            futures = [
+                executor.submit(self._extract_chunk, file, chunk, chunk_result)
+                for chunk, chunk_result in zip(outer_chunks, chunk_results)
+            ]
+
+        # Merge in chunk order, so that the results don't depend on thread timing.
+        # A failing chunk keeps its partial result and doesn't affect the others.
+        for future, chunk_result in zip(futures, chunk_results):
+            for report in chunk_result.reports:
+                self.result.add_report(report)
+            for subtask in chunk_result.subtasks:
+                self.result.add_subtask(subtask)
+
+            exc = future.exception()
+            if exc is not None:
+                self.result.add_report(UnknownError(exception=exc))
+                logger.exception(
+                    "Unknown error happened while processing chunk", exc_info=exc
+                )
 
     def _ensure_root_extract_dir(self):
         # ensure that the root extraction directory is created even for empty extractions
@@ -360,23 +449,51 @@ class _FileTask:
 
     def _calculate_entropy(self, path: Path):
         if self.task.depth < self.config.entropy_depth:
-            calculate_entropy(path, draw_plot=self.config.entropy_plot)
+            # The pure-Python fallback holds the GIL, more threads would only contend
+            # for it. The workers share the CPUs, so each of them only gets its share.
+            thread_num = (
+                max(1, DEFAULT_PROCESS_NUM // self.config.process_num)
+                if RUST_EXTENSION_LOADED
+                else 1
+            )
+            calculate_entropy(
+                path,
+                draw_plot=self.config.entropy_plot,
+                thread_num=thread_num,
+            )
 
-    def _extract_chunk(self, file, chunk: ValidChunk):
+    def _carve_chunk(self, file: File, chunk: ValidChunk) -> Optional[Path]:
         is_whole_file_chunk = chunk.start_offset == 0 and chunk.end_offset == self.size
 
         skip_carving = is_whole_file_chunk
         if skip_carving:
+            return None
+        return carve_valid_chunk(self.carve_dir, file, chunk)
+
+    def _extract_chunk(self, file: File, chunk: ValidChunk, result: TaskResult):
+        """Carve and extract a chunk, collecting its reports and subtasks in a separate result.
+
+        It is called from multiple threads, so it must not touch ``self.result``.
+        """
+        # Carving reads the file at explicit offsets, so it can run on any thread.
+        # The slot is held while the carved chunk is on the disk, so besides the
+        # extractions it also limits the disk space taken by carved chunks.
+        with self.extraction_slots:
+            carved_path = self._carve_chunk(file, chunk)
+            self._extract_carved_chunk(chunk, carved_path, result)
+
+    def _extract_carved_chunk(
+        self, chunk: ValidChunk, carved_path: Optional[Path], result: TaskResult
+    ):
+        if carved_path is None:
             inpath = self.task.path
             extract_dir = self.carve_dir
-            carved_path = None
         else:
-            inpath = carve_valid_chunk(self.carve_dir, file, chunk)
+            inpath = carved_path
             extract_dir = self.carve_dir / (inpath.name + self.config.extract_suffix)
-            carved_path = inpath
 
         if self.config.skip_extraction:
-            fix_extracted_directory(extract_dir, self.result)
+            fix_extracted_directory(extract_dir, result)
             return
 
         extraction_reports = []
@@ -394,13 +511,13 @@ class _FileTask:
             logger.exception("Unknown error happened while extracting chunk")
             extraction_reports.append(UnknownError(exception=exc))
 
-        self.result.add_report(chunk.as_report(extraction_reports))
+        result.add_report(chunk.as_report(extraction_reports))
 
         # we want to get consistent partial output even in case of unforeseen problems
-        fix_extracted_directory(extract_dir, self.result)
+        fix_extracted_directory(extract_dir, result)
 
         if extract_dir.exists():
-            self.result.add_subtask(
+            result.add_subtask(
                 Task(
                     chunk_id=chunk.id,
                     path=extract_dir,
@@ -414,90 +531,113 @@ def delete_empty_extract_dir(extract_dir: Path):
         extract_dir.rmdir()
 
 
-def remove_inner_chunks(chunks: List[ValidChunk]) -> List[ValidChunk]:
-    """Remove all chunks from the list which are within another bigger chunks."""
-    if not chunks:
-        return []
-
-    chunks_by_size = sorted(chunks, key=attrgetter("size"), reverse=True)
-    outer_chunks = [chunks_by_size[0]]
-    for chunk in chunks_by_size[1:]:
-        if not any(outer.contains(chunk) for outer in outer_chunks):
-            outer_chunks.append(chunk)
-
-    outer_count = len(outer_chunks)
-    removed_count = len(chunks) - outer_count
-    logger.debug(
-        "Removed inner chunks",
-        outer_chunk_count=noformat(outer_count),
-        removed_inner_chunk_count=noformat(removed_count),
-        _verbosity=2,
-    )
-    return outer_chunks
-
-
-def calculate_unknown_chunks(
+def partition_chunks(
     chunks: List[ValidChunk], file_size: int
-) -> List[UnknownChunk]:
-    """Calculate the empty gaps between chunks."""
+) -> Tuple[List[ValidChunk], List[UnknownChunk]]:
+    """Split the found chunks to outer chunks and the unknown gaps between them.
+
+    Chunks which are within another chunk are dropped. A chunk is within another
+    one, if the other starts before it and ends at or after its end. Both returned
+    lists are ordered by start offset.
+    """
     if not chunks or file_size == 0:
-        return []
+        return [], []
 
-    sorted_by_offset = sorted(chunks, key=attrgetter("start_offset"))
+    whole_file_chunk = next(
+        (c for c in chunks if c.start_offset == 0 and c.end_offset == file_size), None
+    )
+    if whole_file_chunk:
+        # Very common special case (e.g. a whole filesystem image), every other
+        # chunk is dropped, even the ones also starting at 0.
+        logger.debug(
+            "Chunk covers the whole file", chunk=whole_file_chunk, _verbosity=2
+        )
+        return [whole_file_chunk], []
 
+    outer_chunks = []
     unknown_chunks = []
 
-    first = sorted_by_offset[0]
-    if first.start_offset != 0:
-        unknown_chunk = UnknownChunk(0, first.start_offset)
-        unknown_chunks.append(unknown_chunk)
+    # A chunk is within another one if any chunk starting before it ends at or
+    # after its end, and there is a gap if no chunk
+    # starting before it reaches its start. So a single pass over the chunks
+    # sorted by offset, tracking the furthest end seen so far is enough.
+    # Chunks starting at the same offset are not within each other, so they are
+    # all compared to the furthest end of the chunks starting before them.
+    start_offset = -1
+    previous_end_offset = 0
+    furthest_end_offset = 0
+    for chunk in sorted(chunks, key=attrgetter("start_offset")):
+        if chunk.start_offset != start_offset:
+            start_offset = chunk.start_offset
+            previous_end_offset = furthest_end_offset
+            if start_offset > previous_end_offset:
+                unknown_chunk = UnknownChunk(
+                    start_offset=previous_end_offset,
+                    end_offset=start_offset,
+                )
+                unknown_chunks.append(unknown_chunk)
 
-    for chunk, next_chunk in pairwise(sorted_by_offset):
-        diff = next_chunk.start_offset - chunk.end_offset
-        if diff != 0:
-            unknown_chunk = UnknownChunk(
-                start_offset=chunk.end_offset,
-                end_offset=next_chunk.start_offset,
-            )
-            unknown_chunks.append(unknown_chunk)
+        if chunk.end_offset > previous_end_offset:
+            outer_chunks.append(chunk)
+        furthest_end_offset = max(furthest_end_offset, chunk.end_offset)
 
-    last = sorted_by_offset[-1]
-    if last.end_offset < file_size:
+    if furthest_end_offset < file_size:
         unknown_chunk = UnknownChunk(
-            start_offset=last.end_offset,
+            start_offset=furthest_end_offset,
             end_offset=file_size,
         )
         unknown_chunks.append(unknown_chunk)
 
-    return unknown_chunks
+    outer_count = len(outer_chunks)
+    removed_count = len(chunks) - outer_count
+    logger.debug(
+        "Removed inner chunks",
+        outer_chunk_count=noformat(outer_count),
+        removed_inner_chunk_count=noformat(removed_count),
+        _verbosity=2,
+    )
+    return outer_chunks, unknown_chunks
 
 
-def calculate_entropy(path: Path, *, draw_plot: bool):
+def calculate_entropy(path: Path, *, draw_plot: bool, thread_num: int = 1):
     """Calculate and log shannon entropy divided by 8 for the file in 1mB chunks.
 
     Shannon entropy returns the amount of information (in bits) of some numeric
     sequence. We calculate the average entropy of byte chunks, which in theory
     can contain 0-8 bits of entropy. We normalize it for visualization to a
     0-100% scale, to make it easier to interpret the graph.
-    """
-    percentages = []
-
-    # We could use the chunk size instead of another syscall,
-    # but we rely on the actual file size written to the disk
-    file_size = path.stat().st_size
-    logger.debug("Calculating entropy for file", path=path, size=file_size)
-
-    # Smaller chuk size would be very slow to calculate.
-    # 1Mb chunk size takes ~ 3sec for a 4,5 GB file.
-    buffer_size = calculate_buffer_size(
-        file_size, chunk_count=80, min_limit=1024, max_limit=1024 * 1024
-    )
 
+    Chunks are independent of each other, so they are calculated on up to
+    ``thread_num`` threads. This only pays off with the Rust extension, which
+    releases the GIL while calculating. The calculation is CPU bound, so the
+    caller must make sure not to oversubscribe the CPUs.
+    """
     with File.from_path(path) as file:
-        for chunk in iterate_file(file, 0, file_size, buffer_size=buffer_size):
+        # We could use the chunk size, but we rely on the actual file size
+        # written to the disk. mmap already fstat()-ed the file when mapping it,
+        # so its length comes without another syscall.
+        file_size = len(file)
+        logger.debug("Calculating entropy for file", path=path, size=file_size)
+
+        # Smaller chuk size would be very slow to calculate.
+        # 1Mb chunk size takes ~ 3sec for a 4,5 GB file.
+        buffer_size = calculate_buffer_size(
+            file_size, chunk_count=80, min_limit=1024, max_limit=1024 * 1024
+        )
+
+        def chunk_entropy_percentage(offset: int) -> float:
+            # slicing does not move the file position, so it is safe across threads
+            chunk = file[offset : offset + buffer_size]  # noqa: E203
             entropy = shannon_entropy(chunk)
-            entropy_percentage = round(entropy / 8 * 100, 2)
-            percentages.append(entropy_percentage)
+            return round(entropy / 8 * 100, 2)
+
+        file.advise_sequential()
+        offsets = range(0, file_size, buffer_size)
+        if thread_num == 1:
+            percentages = list(map(chunk_entropy_percentage, offsets))
+        else:
+            with ThreadPoolExecutor(max_workers=thread_num) as executor:
+                percentages = list(executor.map(chunk_entropy_percentage, offsets))
 
     logger.debug(
         "Entropy calculated",
@@ -532,8 +672,10 @@ def draw_entropy_plot(percentages: List[float]):
     # 16 height leaves no gaps between the lines
     plt.plot_size(100, 16)
     plt.ylim(0, 100)
-    # Draw ticks every 1Mb on the x axis.
-    plt.xticks(range(len(percentages) + 1))
+    # Draw ticks every 1Mb on the x axis, but not more than the 100 character wide
+    # chart can show, as plotext lays out every tick even if it is not rendered.
+    tick_step = max(1, len(percentages) // 50)
+    plt.xticks(range(0, len(percentages) + 1, tick_step))
     # Always show 0% and 100%
     plt.yticks(range(0, 101, 10))
 
@@ -125,10 +125,12 @@ class StatReport(Report):
     def from_path(cls, path: Path):
         st = path.lstat()
         mode = st.st_mode
-        try:
-            link_target = Path(os.readlink(path))
-        except OSError:
-            link_target = None
+        link_target = None
+        if stat.S_ISLNK(mode):
+            try:
+                link_target = Path(os.readlink(path))
+            except OSError:
+                pass
 
         return cls(
             path=path,